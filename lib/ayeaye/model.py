@@ -553,16 +553,26 @@ class PartitionedModel(Model):
             self.runtime.total_workers = 1
 
             subtasks_complete = 0
+            m = None
+            m_key = None
             for task in task_definitions:
                 # re-create self as a new instance model. This keeps single process mode insync
-                # with the `process_pool` mode.
-                m = task.model_cls(**task.model_construction_kwargs)
+                # with the `process_pool` mode, which also re-uses the instance while subtasks
+                # need the same model.
+                task_key = (
+                    task.model_cls,
+                    task.model_construction_kwargs,
+                    task.partition_initialise_kwargs,
+                )
+                if m is None or task_key != m_key:
+                    m = task.model_cls(**task.model_construction_kwargs)
 
-                # it's running in the same process as self so share logging
-                m.log_to_stdout = self.log_to_stdout
-                m.external_loggers = self.external_loggers
+                    # it's running in the same process as self so share logging
+                    m.log_to_stdout = self.log_to_stdout
+                    m.external_loggers = self.external_loggers
 
-                m.partition_initialise(**task.partition_initialise_kwargs)
+                    m.partition_initialise(**task.partition_initialise_kwargs)
+                    m_key = task_key
 
                 sub_task_method = getattr(m, task.method_name)
                 subtask_return_value = sub_task_method(**task.method_kwargs)
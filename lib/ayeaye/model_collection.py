@@ -1,5 +1,4 @@
 from collections import defaultdict
-import copy
 from dataclasses import dataclass
 from inspect import isclass
 
@@ -8,6 +7,13 @@ from ayeaye.connectors.multi_connector import MultiConnector
 from ayeaye.model import Model
 from ayeaye.pinnate import Pinnate
 
+# bit flags for how a dataset is used across all the models in a collection
+_DATASET_READ = 1
+_DATASET_WRITE = 2
+
+_READ_MODES = frozenset({AccessMode.READ, AccessMode.READWRITE})
+_WRITE_MODES = frozenset({AccessMode.WRITE, AccessMode.READWRITE})
+
 
 class ModelCollection:
     def __init__(self, models):
@@ -22,6 +28,9 @@ class ModelCollection:
         """
         super().__init__()
 
+        # key is a label for the graph, value is (models the graph was built from, graph)
+        self._graph_cache = {}
+
         invalid_construction_msg = (
             "models must be a class, list, set or callable. All of which "
             "result in one or more :class:`ayeaye.Models` classes (not "
@@ -39,7 +48,7 @@ class ModelCollection:
             raise NotImplementedError("TODO")
 
         elif isinstance(models, (list, set)):
-            if not all([isclass(m) and issubclass(m, Model) for m in models]):
+            if not all(isclass(m) and issubclass(m, Model) for m in models):
                 raise ValueError(invalid_construction_msg)
             self.models = models
 
@@ -56,20 +65,36 @@ class ModelCollection:
         """
         yield from self.models
 
+    def _cached_graph(self, label, build):
+        """
+        Building graphs only depends on the models in the collection so keep the result until the
+        set of models changes.
+
+        @param label: (str) to identify the graph
+        @param build: (callable) without arguments that builds the graph
+        @return: whatever `build` returns. Callers shouldn't alter it.
+        """
+        models_key = frozenset(self.models)
+        cached = self._graph_cache.get(label)
+        if cached is None or cached[0] != models_key:
+            cached = (models_key, build())
+            self._graph_cache[label] = cached
+        return cached[1]
+
     def _base_graph(self):
         """Find all the datasets in all the models and classify datasets as 'sources' (READ access)
         and 'targets' (WRITE access) or READWRITE for both.
 
-        @return: (targets, sources, nodes) (set, set, dictionary)
+        @return: (nodes, dataset_access) (dictionary, dictionary)
 
-            node - 'datasets' are a subclasses of :class:`Connect` or :class:`DataConnector`
+            'datasets' are a subclasses of :class:`Connect` or :class:`DataConnector`
 
-            all_targets - one or more models writes to these
-            all_sources - one or more models read from these
-            nodes - key is model class, value is Pinnate with .model_cls, .model_name, .targets, .sources
+            nodes - key is model class, value is :class:`ModelNode`
+            dataset_access - key is dataset, value is bit flags (int) of `_DATASET_READ` when one or
+                more models reads from the dataset and `_DATASET_WRITE` when one or more models
+                writes to it.
         """
-        all_targets = set()
-        all_sources = set()
+        dataset_access = defaultdict(int)
         nodes = {}
         for model_cls in self.models:
             # TODO find ModelConnectors and recurse into those
@@ -77,13 +102,8 @@ class ModelCollection:
             if model_name in nodes:
                 raise ValueError(f"Duplicate node found: {model_name}")
 
-            node = Pinnate(
-                {
-                    "model_cls": model_cls,
-                    "model_name": model_name,
-                    "targets": set(),
-                    "sources": set(),
-                }
+            node = ModelNode(
+                model_cls=model_cls, model_name=model_name, targets=set(), sources=set()
             )
 
             # as instantiated model
@@ -108,23 +128,59 @@ class ModelCollection:
                         model_attrib_label=class_attrib_label, connector=dataset_connector
                     )
 
-                    if dataset_connector.access in [AccessMode.READ, AccessMode.READWRITE]:
+                    if dataset_connector.access in _READ_MODES:
                         node.sources.add(dataset_container)
-                        all_sources.add(dataset_container)
+                        dataset_access[dataset_container] |= _DATASET_READ
 
-                    if dataset_connector.access in [AccessMode.WRITE, AccessMode.WRITE]:
+                    if dataset_connector.access in _WRITE_MODES:
                         node.targets.add(dataset_container)
-                        all_targets.add(dataset_container)
+                        dataset_access[dataset_container] |= _DATASET_WRITE
 
             nodes[model_cls] = node
 
-        return all_targets, all_sources, nodes
+        return nodes, dataset_access
+
+    @staticmethod
+    def _leaf_datasets(dataset_access):
+        """
+        @param dataset_access: (dict) as returned by :meth:`_base_graph`
+        @return: (leaf_sources, leaf_targets) (set, set)
+            leaf_sources - datasets that are read but not written to
+            leaf_targets - datasets that are written to but not read
+        """
+        leaf_sources = set()
+        leaf_targets = set()
+        for dataset, access in dataset_access.items():
+            if access == _DATASET_READ:
+                leaf_sources.add(dataset)
+            elif access == _DATASET_WRITE:
+                leaf_targets.add(dataset)
+
+        return leaf_sources, leaf_targets
 
     def _resolve_run_order(self):
         """
         Use the dataset connections in each model to determine the dependencies between models and
         therefore the order to run them in.
 
+        @see :meth:`_build_run_order` for the return. The containers are copies so can be altered
+        by the caller.
+        """
+        resolved = self._cached_graph("run_order", self._build_run_order)
+        p = Pinnate(
+            {
+                "leaf_sources": set(resolved.leaf_sources),
+                "leaf_targets": set(resolved.leaf_targets),
+                "run_order": [set(wave) for wave in resolved.run_order],
+            }
+        )
+        return p
+
+    def _build_run_order(self):
+        """
+        Use the dataset connections in each model to determine the dependencies between models and
+        therefore the order to run them in.
+
         @return: (Pinnate) with attributes:
                     leaf_sources (set of datasets) - read but not written to
                     leaf_targets (set of datasets) - written to but not read - end goal of model
@@ -132,24 +188,35 @@ class ModelCollection:
                             Each set must be complete before the next set is run.
 
                     'datasets' as subclasses of :class:`Connect`
-                    `nodes` are type :class:`Pinnate` with attributes model_cls, model_name,
+                    `nodes` are type :class:`ModelNode` with attributes model_cls, model_name,
                         targets and sources
         """
         # This algorithm is a bit overly simplistic and sub-optimal. The return is a list of sets
         # with all models in set needing to be run. But the set is actually the models that were
         # ready to run when the prior models are complete. So there could be subsequent models that
         # are only waiting on a subset of each set.
-        all_targets, all_sources, nodes = self._base_graph()
+        nodes, dataset_access = self._base_graph()
+        leaf_sources, leaf_targets = self._leaf_datasets(dataset_access)
+
+        # A model with READWRITE access to a dataset that no other model writes to would otherwise
+        # be waiting on itself.
+        writers_count = defaultdict(int)
+        for node in nodes.values():
+            for dataset_container in node.targets:
+                writers_count[dataset_container] += 1
 
-        leaf_sources = all_sources - all_targets
-        leaf_targets = all_targets - all_sources
+        # frozen once as these are checked against `completed` on every pass
+        dependencies = {}
+        for node in nodes.values():
+            own_datasets = {d for d in node.targets if writers_count[d] == 1}
+            dependencies[node.model_cls] = frozenset(node.sources - own_datasets)
 
-        completed = copy.copy(leaf_sources)
+        completed = set(leaf_sources)
         run_order = []
         while len(nodes) > 0:
             loop_ready = set()
             for node in nodes.values():
-                if node.sources.issubset(completed):
+                if dependencies[node.model_cls].issubset(completed):
                     loop_ready.add(node)
 
             if len(loop_ready) == 0:
@@ -178,26 +245,20 @@ class ModelCollection:
         All models in a set can be run in parallel. Each set must be complete before the next set
         in the list is run.
         """
+        if len(self.models) <= 1:
+            # nothing to resolve so don't build the graph
+            return [{m} for m in self.models]
+
         if isinstance(self.models, list):
             # models in 'list' mode are wrapped as single item sets because all items in a set must
             # complete before next item in a list is run.
-            return [{m} for m in self]
+            return [{m} for m in self.models]
 
         elif isinstance(self.models, set):
-            # _resolve_run_order returns leaf nodes and the run order is built using Pinnate
+            # _resolve_run_order returns leaf nodes and the run order is built using ModelNode
             # instances as nodes. Remove all this with to return a simple run order.
             resolved_order = self._resolve_run_order()
-
-            def simplify_nodes(n):
-                if isinstance(n, Pinnate):
-                    return n.model_cls
-                if isinstance(n, (set, list)):
-                    rx = [simplify_nodes(nx) for nx in n]
-                    if isinstance(n, set):
-                        return set(rx)
-                    return rx
-
-            return [simplify_nodes(r) for r in resolved_order.run_order]
+            return [{node.model_cls for node in wave} for wave in resolved_order.run_order]
 
         else:
             raise ValueError("Unknown models container.")
@@ -207,67 +268,92 @@ class ModelCollection:
         self.models is a set of :class:`ayeaye.Model`s. These might all be interconnected or they
         may form multiple graphs.
 
-        @return: set (graphs) of sets (edges)
-            graphs are a set of edges
+        @return: list (graphs) of lists (edges)
+            graphs are the edges for models that are connected by datasets. Each graph is separate
+            from the others.
             edges are :class:`ModelGraphEdge` objects.
         """
-        all_targets, all_sources, nodes = self._base_graph()
-        leaf_sources = all_sources - all_targets
-        leaf_targets = all_targets - all_sources
+        graph_set = self._cached_graph("dataset_provenance", self._build_dataset_provenance)
+        return [list(graph) for graph in graph_set]
+
+    def _build_dataset_provenance(self):
+        """
+        @see :meth:`dataset_provenance`
+        """
+        nodes, dataset_access = self._base_graph()
 
-        # lookup to sources for each dataset
-        dataset_sources = defaultdict(list)
+        # Models writing (producers) and reading (consumers) each dataset. Values are lists of
+        # (model class, dataset container) as each model might use a different attrib name for
+        # the same dataset.
+        producers = defaultdict(list)
+        consumers = defaultdict(list)
         for node in nodes.values():
+            for dataset_container in node.targets:
+                producers[dataset_container].append((node.model_cls, dataset_container))
             for dataset_container in node.sources:
-                dataset_sources[dataset_container].append(node.model_cls)
-
-        def dataset_source(target_dataset_container):
-            "generator yielding model classes"
-            for source_model_cls in dataset_sources[target_dataset_container]:
-                for source_dataset_container in nodes[source_model_cls].sources:
-                    if source_dataset_container == target_dataset_container:
-                        yield source_model_cls, source_dataset_container
-
+                consumers[dataset_container].append((node.model_cls, dataset_container))
+
+        # union-find to group models that share datasets into separate graphs
+        parent = {model_cls: model_cls for model_cls in nodes}
+
+        def find(model_cls):
+            while parent[model_cls] is not model_cls:
+                parent[model_cls] = parent[parent[model_cls]]
+                model_cls = parent[model_cls]
+            return model_cls
+
+        for dataset in dataset_access:
+            dataset_models = producers.get(dataset, []) + consumers.get(dataset, [])
+            root = find(dataset_models[0][0])
+            for model_cls, _ in dataset_models[1:]:
+                other_root = find(model_cls)
+                if other_root is not root:
+                    parent[other_root] = root
+
+        # a leaf is the side of a dataset without any models, it's shown as None in the edge
+        leaf = [(None, None)]
         edge_set = set()
-        for node in nodes.values():
-            # print(node.model_cls.__name__, len(node.targets))
+        for dataset in dataset_access:
+            dataset_producers = producers.get(dataset) or leaf
+            dataset_consumers = consumers.get(dataset) or leaf
+            for model_a, dataset_container_a in dataset_producers:
+                for model_b, dataset_container_b in dataset_consumers:
+                    if dataset_container_a is None:
+                        dataset_label = dataset_container_b.model_attrib_label
+                    else:
+                        dataset_label = dataset_container_a.model_attrib_label
+                        # models might each use different attrib names
+                        if (
+                            dataset_container_b is not None
+                            and dataset_label != dataset_container_b.model_attrib_label
+                        ):
+                            dataset_label += " / " + dataset_container_b.model_attrib_label
 
-            for dataset_container_a in node.sources:
-                if dataset_container_a in leaf_sources:
-                    dataset_label = dataset_container_a.model_attrib_label
                     mge = ModelGraphEdge(
-                        model_a=None, model_b=node.model_cls, dataset_label=dataset_label
+                        model_a=model_a, model_b=model_b, dataset_label=dataset_label
                     )
                     edge_set.add(mge)
 
-            for dataset_container_a in node.targets:
-                if dataset_container_a in leaf_targets:
-                    dataset_label = dataset_container_a.model_attrib_label
-                    mge = ModelGraphEdge(
-                        model_a=node.model_cls, model_b=None, dataset_label=dataset_label
-                    )
-                    edge_set.add(mge)
+        graphs = defaultdict(list)
+        for edge in edge_set:
+            model_cls = edge.model_a if edge.model_a is not None else edge.model_b
+            graphs[find(model_cls)].append(edge)
 
-                for model_b, dataset_container_b in dataset_source(dataset_container_a):
-                    # print(node.model_cls, dataset_container_a, model_b, dataset_container_b)
+        return list(graphs.values())
 
-                    dataset_label = dataset_container_a.model_attrib_label
-                    # models might each use different attrib names
-                    if (
-                        dataset_container_b is not None
-                        and dataset_label != dataset_container_b.model_attrib_label
-                    ):
-                        dataset_label += " / " + dataset_container_b.model_attrib_label
 
-                    mge = ModelGraphEdge(
-                        model_a=node.model_cls, model_b=model_b, dataset_label=dataset_label
-                    )
-                    edge_set.add(mge)
+@dataclass(eq=False)
+class ModelNode:
+    """
+    A model within the graphs built by :class:`ModelCollection`. Nodes are compared by identity.
+    """
+
+    __slots__ = ("model_cls", "model_name", "targets", "sources")
 
-        # TODO - are sub graphs needed?
-        graph_set = list()
-        graph_set.append(list(edge_set))
-        return graph_set
+    model_cls: Model
+    model_name: str
+    targets: set  # of :class:`ModelDataset`
+    sources: set  # of :class:`ModelDataset`
 
 
 @dataclass
@@ -279,15 +365,21 @@ class ModelDataset:
     :class:`DataConnector`. Hold these (todo) and other associated info about the dataset.
     """
 
+    __slots__ = ("model_attrib_label", "connector", "_hash")
+
     model_attrib_label: str  # name of class variable in parent model
     connector: object  #  ayeaye.Connect
 
+    def __post_init__(self):
+        # instances spend their life in sets so hash the connector just once
+        self._hash = self.connector.__hash__()
+
     def __hash__(self):
         """
         super critical to graphs being able to build is equating two datasets are the same thing
         without the name (i.e. model_attrib_label) mattering.
         """
-        return self.connector.__hash__()
+        return self._hash
 
     def __eq__(self, other):
         if isinstance(other, type(self)):
@@ -295,7 +387,7 @@ class ModelDataset:
         return False
 
 
-@dataclass
+@dataclass(frozen=True)
 class ModelGraphEdge:
     """
     A representation of the :class:`ModelGraph` is a list of edges.
@@ -304,12 +396,17 @@ class ModelGraphEdge:
     This was an arbitrary decision, it could have been two datasets and a model.
     """
 
+    __slots__ = ("model_a", "model_b", "dataset_label", "_hash")
+
     model_a: Model
     model_b: Model
     dataset_label: str
 
+    def __post_init__(self):
+        object.__setattr__(self, "_hash", hash((self.model_a, self.model_b, self.dataset_label)))
+
     def __hash__(self):
-        return hash((self.model_a, self.model_b, self.dataset_label))
+        return self._hash
 
 
 class VisualiseModels:
@@ -345,14 +442,18 @@ class VisualiseModels:
         # if len(graphset) > 1:
         #     raise NotImplementedError("Multiple graphs within one collection of models is not yet implemented!")
 
-        out = ["graph LR"]
-        for graph in graphset:
-            # graphs don't need to be separate for Mermaid
-            for edge in graph:
-                model_a = edge.model_a.__name__ if edge.model_a is not None else next(leaf_label)
-                model_b = edge.model_b.__name__ if edge.model_b is not None else next(leaf_label)
+        name_of = {model_cls: model_cls.__name__ for model_cls in self.model_collection}
+
+        def node_name(model_cls):
+            return name_of[model_cls] if model_cls is not None else next(leaf_label)
 
-                edge_fmt = f"{model_a}-->|{edge.dataset_label}| {model_b}"
-                out.append(edge_fmt)
+        def mermaid_lines():
+            yield "graph LR"
+            for graph in graphset:
+                # graphs don't need to be separate for Mermaid
+                for edge in graph:
+                    model_a = node_name(edge.model_a)
+                    model_b = node_name(edge.model_b)
+                    yield "%s-->|%s| %s" % (model_a, edge.dataset_label, model_b)
 
-        return "\n".join(out)
+        return "\n".join(mermaid_lines())
@@ -1,5 +1,24 @@
 import json
 
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+
+def _json_loads(json_str):
+    """
+    Use orjson when it's installed as it's faster. It's stricter than the standard library (e.g.
+    NaN and integers beyond 64 bit aren't accepted) so anything it rejects is given to `json`.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError:
+            pass
+
+    return json.loads(json_str)
+
 
 class Pinnate:
     """
@@ -25,6 +44,8 @@ class Pinnate:
     3
     """
 
+    __slots__ = ("_attr",)
+
     def __init__(self, data=None):
         """
         :param data: mixed
@@ -64,14 +85,17 @@ class Pinnate:
 
         @return: boolean
         """
-        return any([type(self._attr) == pt for pt in payload_type])
+        payload_cls = type(self._attr)
+        if len(payload_type) == 1:
+            return payload_cls is payload_type[0]
+        return payload_cls in payload_type
 
     def __unicode__(self):
         as_str = str(self._attr)
         return f"<Pinnate {as_str}>"
 
     def __str__(self):
-        return self.__unicode__().encode("ascii", "replace").decode()
+        return self.__unicode__()
 
     def keys(self):
         if self.payload_undefined or not self.is_payload(dict):
@@ -112,12 +136,12 @@ class Pinnate:
 
         For lists and sets the generator yields each item. For dictionaries it yield (key, value)
         """
-        if self.is_payload(set, list):
+        payload_cls = type(self._attr)
+        if payload_cls is set or payload_cls is list:
             return iter(self._attr)
 
-        if self.is_payload(dict):
-            as_key_pairs = [(k, v) for k, v in self._attr.items()]
-            return iter(as_key_pairs)
+        if payload_cls is dict:
+            return iter(self._attr.items())
 
     def as_dict(self, select_fields=None):
         """
@@ -127,20 +151,11 @@ class Pinnate:
         if not self.is_payload(dict):
             raise TypeError(f"as_dict() can only be called when the payload data is a dictionary")
 
+        native_value = self._native_value
         if select_fields is not None:
-            r = {}
-            for k in select_fields:
-                if isinstance(self._attr[k], self.__class__):
-                    v = self._attr[k].as_dict()
-                else:
-                    v = self._attr[k]
-                r[k] = v
-            return r
+            return {k: native_value(self._attr[k]) for k in select_fields}
         else:
-            return {
-                k: v.as_native() if isinstance(v, self.__class__) else v
-                for k, v in self._attr.items()
-            }
+            return {k: native_value(v) for k, v in self._attr.items()}
 
     def as_native(self):
         """
@@ -148,28 +163,74 @@ class Pinnate:
             representation of the payload (as children elements) comprised of
             native python data types.
         """
-        if self.payload_undefined:
-            return None
-
-        if self.is_payload(dict):
+        payload_cls = type(self._attr)
+        if payload_cls is dict:
             return self.as_dict()
 
-        if self.is_payload(list):
-            r = []
-            for item in self._attr:
-                value = item.as_native() if isinstance(item, self.__class__) else item
-                r.append(value)
-            return r
+        native_value = self._native_value
+        if payload_cls is list:
+            return [native_value(item) for item in self._attr]
 
-        if self.is_payload(set):
-            r = set()
-            for item in self._attr:
-                value = item.as_native() if isinstance(item, self.__class__) else item
-                r.add(value)
-            return r
+        if self._attr is None:
+            return None
+
+        if payload_cls is set:
+            return {native_value(item) for item in self._attr}
 
         raise TypeError("Unsupported type")
 
+    @classmethod
+    def _native_value(cls, value):
+        """
+        @return: (mixed) `value` with any :class:`Pinnate` objects, including those within lists,
+            returned to native python data types.
+        """
+        # :meth:`_wrap_value` stores nested values as plain lists and instances of the parent's
+        # class so these can be checked by type identity.
+        value_cls = type(value)
+        if value_cls is cls:
+            return value.as_native()
+
+        if value_cls is list:
+            return [cls._native_value(item) for item in value]
+
+        if isinstance(value, Pinnate):
+            # a different subclass of Pinnate that was stored as it is
+            return value.as_native()
+
+        return value
+
+    def _wrap_value(self, value):
+        """
+        Dictionaries, including those within lists, are stored as :class:`Pinnate` objects when
+        they are added so attribute access is just a lookup.
+
+        @return: (mixed) `value` ready to be stored in the payload
+        """
+        if isinstance(value, dict):
+            p = self.__class__()
+            p.update(value)
+            return p
+
+        if isinstance(value, list):
+            # lists within lists are walked with a stack of (source list, wrapped list) rather
+            # than by recursion. Each wrapped list is added to its parent before being filled so
+            # the order is kept.
+            wrapped = []
+            stack = [(value, wrapped)]
+            while stack:
+                source_list, wrapped_list = stack.pop()
+                for item in source_list:
+                    if isinstance(item, list):
+                        wrapped_item = []
+                        stack.append((item, wrapped_item))
+                    else:
+                        wrapped_item = self._wrap_value(item)
+                    wrapped_list.append(wrapped_item)
+            return wrapped
+
+        return value
+
     def as_json(self, *args, **kwargs):
         """
         @see :meth:`as_dict` for params.
@@ -178,37 +239,27 @@ class Pinnate:
         return json.dumps(self.as_native(*args, **kwargs), default=str)
 
     def __getattr__(self, attr):
-        if attr not in self._attr:
-            raise AttributeError(
-                "{} instance has no attribute '{}'".format(self.__class__.__name__, attr)
-            )
-        if isinstance(self._attr[attr], list):
-
-            def list_recurse(item):
-                r = []
-                for s in item:
-                    if isinstance(s, dict):
-                        r.append(self.__class__(s))
-                    elif isinstance(s, list):
-                        r.append(list_recurse(s))
-                    else:
-                        r.append(s)
-                return r
-
-            return list_recurse(self._attr[attr])
+        # only called when normal attribute lookup fails. '_attr' would only be missing before
+        # construction or un-pickling have set it.
+        if attr != "_attr":
+            try:
+                return self._attr[attr]
+            except (KeyError, TypeError):
+                pass
 
-        elif isinstance(self._attr[attr], dict):
-            return self.__class__(self._attr[attr])
-        else:
-            return self._attr[attr]
+        raise AttributeError(
+            "{} instance has no attribute '{}'".format(self.__class__.__name__, attr)
+        )
 
     def __setattr__(self, attr, val):
-        super(Pinnate, self).__setattr__(attr, val)
-        if attr != "_attr":
-            if self.payload_undefined:
-                self._attr = {}
+        if attr == "_attr":
+            super(Pinnate, self).__setattr__(attr, val)
+            return
 
-            self._attr[attr] = val
+        if self.payload_undefined:
+            self._attr = {}
+
+        self._attr[attr] = self._wrap_value(val)
 
     def __getitem__(self, key):
         return self._attr[key]
@@ -218,7 +269,7 @@ class Pinnate:
             # if key is an integer the datatype *could* also be list
             self._attr = {}
 
-        self._attr[key] = value
+        self._attr[key] = self._wrap_value(value)
 
     def __getstate__(self):
         """
@@ -248,7 +299,7 @@ class Pinnate:
         """
 
         if isinstance(data, str):
-            data = json.loads(data)
+            data = _json_loads(data)
 
         self.update(data)
 
@@ -287,25 +338,21 @@ class Pinnate:
             raise TypeError(msg)
 
         if self.is_payload(dict):
-            for k, v in data.items():
-                if isinstance(v, dict):
-                    self._attr[k] = Pinnate(v)
-                else:
-                    self._attr[k] = v
+            if any(isinstance(v, (dict, list)) for v in data.values()):
+                wrap_value = self._wrap_value
+                for k, v in data.items():
+                    self._attr[k] = wrap_value(v)
+            else:
+                # flat data, nothing needs wrapping
+                self._attr.update(data)
 
         elif self.is_payload(list):
             for v in data:
-                if isinstance(v, dict):
-                    self._attr.append(Pinnate(v))
-                else:
-                    self._attr.append(v)
+                self._attr.append(self._wrap_value(v))
 
         elif self.is_payload(set):
-            for v in data:
-                if isinstance(v, dict):
-                    self._attr.add(Pinnate(v))
-                else:
-                    self._attr.add(v)
+            # items in a set are hashable so can't be dictionaries or lists
+            self._attr.update(data)
 
     def append(self, item):
         """
@@ -8,6 +8,9 @@ Created on 31 Jan 2022
 import math
 import os
 
+# the number of CPUs isn't going to change during the life of a process
+_CPU_COUNT = os.cpu_count() or 1
+
 
 class RuntimeKnowledge:
     """
@@ -24,6 +27,8 @@ class RuntimeKnowledge:
                     of workers are being used.
     """
 
+    __slots__ = ("worker_id", "total_workers", "cpu_task_ratio", "_max_concurrent_tasks")
+
     def __init__(self):
         self.worker_id = None
         self.total_workers = None
@@ -43,7 +48,7 @@ class RuntimeKnowledge:
             # user has set an absolute value
             return self._max_concurrent_tasks
 
-        return math.ceil(os.cpu_count() * self.cpu_task_ratio)
+        return math.ceil(_CPU_COUNT * self.cpu_task_ratio)
 
     @max_concurrent_tasks.setter
     def max_concurrent_tasks(self, max_tasks):
@@ -1,27 +1,128 @@
 """
 Run :class:`ayeaye.PartitionedModel` models across multiple operating system processes.
 """
-from multiprocessing import Process, Queue
+
+from collections import deque
+from dataclasses import dataclass
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import wait
+import pickle
 import sys
 import traceback
 
 from ayeaye.connect_resolve import connector_resolver
 from ayeaye.runtime.task_message import TaskComplete, TaskFailed, TaskLogMessage, TaskPartition
 
+# Subtasks are sent to workers in batches to cut the number of messages. Aim for this many batches
+# per worker so a slow batch doesn't leave the other workers idle at the end of a run.
+BATCHES_PER_WORKER = 4
+
+# On Linux workers are forked so they start with the parent's modules already imported and don't
+# need anything passed to them to be pickled. Elsewhere the platform's default start method is used
+# as fork isn't safe on all platforms (e.g. OSX).
+if sys.platform.startswith("linux"):
+    mp_context = multiprocessing.get_context("fork")
+else:
+    mp_context = multiprocessing.get_context()
+
+# Messages from subtasks that pickle to more than this number of bytes are passed to the parent in
+# shared memory instead of being copied through the return queue's pipe.
+SHARED_MEMORY_THRESHOLD = 256 * 1024
+
 
 class QueueLogger:
     """
     Redirect log messages from a sub-task's :class:`Process` to the parent's :meth:`log`.
+
+    :meth:`ayeaye.Model.log` calls :meth:`write` once per complete message so there is no need to
+    buffer partial lines.
     """
 
+    __slots__ = ("log_prefix", "log_queue", "_put")
+
     def __init__(self, log_prefix, log_queue):
         self.log_prefix = log_prefix
         self.log_queue = log_queue
+        self._put = log_queue.put
+
+    def write(self, msg):
+        # TODO structured logging
+        self._put(TaskLogMessage(msg=msg))
+
+
+class ConnectionLogger:
+    """
+    Like :class:`QueueLogger` but sends log messages down one end of a
+    :class:`multiprocessing.Pipe`.
+    """
+
+    __slots__ = ("log_prefix", "log_conn", "_send_bytes")
+
+    def __init__(self, log_prefix, log_conn):
+        self.log_prefix = log_prefix
+        self.log_conn = log_conn
+        self._send_bytes = log_conn.send_bytes
 
     def write(self, msg):
         # TODO structured logging
-        log_serialised = TaskLogMessage(msg=msg)
-        self.log_queue.put(log_serialised)
+        self._send_bytes(pack_message(TaskLogMessage(msg=msg)))
+
+
+@dataclass
+class SharedMemoryMessage:
+    """
+    Reference to a pickled subtask message in a :class:`shared_memory.SharedMemory` block. The
+    worker creates the block and the parent unlinks it once the message has been read.
+    """
+
+    name: str
+    size: int
+
+
+def pack_message(task_message):
+    """
+    Prepare a message in a worker process to be sent to the parent.
+
+    @param task_message: subclass of :class:`AbstractTaskMessage`
+    @return: (bytes) the pickled message or, for large messages, a pickled
+        :class:`SharedMemoryMessage`
+    """
+    pickled = pickle.dumps(task_message, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(pickled) <= SHARED_MEMORY_THRESHOLD:
+        return pickled
+
+    block = shared_memory.SharedMemory(create=True, size=len(pickled))
+    block.buf[: len(pickled)] = pickled
+
+    # the parent is responsible for the block now so stop the worker's resource tracker from
+    # removing it when the worker ends
+    resource_tracker.unregister(block._name, "shared_memory")
+    block.close()
+
+    shared_memory_message = SharedMemoryMessage(name=block.name, size=len(pickled))
+    return pickle.dumps(shared_memory_message, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def unpack_message(packed_message):
+    """
+    Reverse :func:`pack_message` in the parent process. Other messages are returned unchanged.
+
+    @return: subclass of :class:`AbstractTaskMessage`
+    """
+    if isinstance(packed_message, bytes):
+        packed_message = pickle.loads(packed_message)
+
+    if isinstance(packed_message, SharedMemoryMessage):
+        block = shared_memory.SharedMemory(name=packed_message.name)
+        try:
+            with block.buf[: packed_message.size] as pickled:
+                return pickle.loads(pickled)
+        finally:
+            block.close()
+            block.unlink()
+
+    return packed_message
 
 
 class AbstractProcessPool:
@@ -120,54 +221,96 @@ class LocalProcessPool(AbstractProcessPool):
         subtasks_count = len(sub_tasks)
         context_kwargs = context_kwargs or {}
 
-        subtasks_queue = Queue()
-        return_values_queue = Queue()
+        batch_size = max(1, subtasks_count // (processes * BATCHES_PER_WORKER))
+        batches = (
+            sub_tasks[batch_start : batch_start + batch_size]
+            for batch_start in range(0, subtasks_count, batch_size)
+        )
+
+        # Each worker has a pipe for receiving batches of subtasks and another for returning
+        # messages. The keys to these dictionaries are the parent's end of the returns pipe.
+        subtasks_conns = {}
+        outstanding_subtasks = {}
 
         self.proc_table = []
         for proc_id in range(processes):
-            proc = Process(
+            subtasks_recv_conn, subtasks_send_conn = mp_context.Pipe(duplex=False)
+            returns_recv_conn, returns_send_conn = mp_context.Pipe(duplex=False)
+            proc = mp_context.Process(
                 target=LocalProcessPool.run_model,
                 kwargs={
                     "worker_id": proc_id,
                     "total_workers": processes,
-                    "subtasks_queue": subtasks_queue,
-                    "returns_queue": return_values_queue,
+                    "subtasks_conn": subtasks_recv_conn,
+                    "returns_conn": returns_send_conn,
                     "context_kwargs": context_kwargs,
                 },
             )
-            self.proc_table.append(proc)
-
-        for proc in self.proc_table:
-            # daemon for the purpose of child processes being terminated when the parent terminates.
-            # proc.daemon = True
+            # Not daemon as daemonic processes can't have children of their own. Orphaned workers
+            # are terminated in :meth:`__del__`.
             proc.start()
+            self.proc_table.append(proc)
 
-        for sub_task in sub_tasks:
-            subtasks_queue.put(sub_task)
-
-        # instruct worker process to terminate
-        for _ in range(processes):
-            subtasks_queue.put(None)
+            # the worker has its own copy of these ends
+            subtasks_recv_conn.close()
+            returns_send_conn.close()
+
+            subtasks_conns[returns_recv_conn] = subtasks_send_conn
+
+        def dispatch(returns_conn):
+            """
+            Send the next batch to an idle worker or tell it to finish when there are none left.
+
+            A worker is only sent a batch once it has finished the previous one. It's therefore
+            waiting to receive so the parent can't block on sending while the worker is blocked on
+            returning messages to the parent.
+            """
+            batch = next(batches, None)
+            pickled_batch = pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)
+            subtasks_conns[returns_conn].send_bytes(pickled_batch)
+            if batch is None:
+                # None means end process as all work has been given out
+                outstanding_subtasks.pop(returns_conn, None)
+            else:
+                # a worker runs its batch in order
+                outstanding_subtasks[returns_conn] = deque(batch)
+
+        for returns_conn in subtasks_conns:
+            dispatch(returns_conn)
 
         completed_procs = 0
         while completed_procs < subtasks_count:
-            task_message = return_values_queue.get()
+            for returns_conn in wait(list(outstanding_subtasks)):
+                task_message = unpack_message(returns_conn.recv_bytes())
 
-            if isinstance(task_message, (TaskComplete, TaskFailed)):
-                completed_procs += 1
+                if isinstance(task_message, (TaskComplete, TaskFailed)):
+                    completed_procs += 1
+                    worker_subtasks = outstanding_subtasks[returns_conn]
+                    subtask = worker_subtasks.popleft()
 
-            # could be a log message or sub-task completed notification
-            yield task_message
+                    if isinstance(task_message, TaskComplete):
+                        # the worker doesn't send back the kwargs it was given
+                        task_message.method_kwargs = subtask.method_kwargs
+
+                    if not worker_subtasks:
+                        dispatch(returns_conn)
+
+                # could be a log message or sub-task completed notification
+                yield task_message
 
         for proc in self.proc_table:
             proc.join()
 
+        for returns_conn, subtasks_conn in subtasks_conns.items():
+            returns_conn.close()
+            subtasks_conn.close()
+
     @staticmethod
     def run_model(
         worker_id,
         total_workers,
-        subtasks_queue,
-        returns_queue,
+        subtasks_conn,
+        returns_conn,
         context_kwargs,
     ):
         """
@@ -177,14 +320,14 @@ class LocalProcessPool(AbstractProcessPool):
         @param total_workers: (int)
             Number of workers in pool or None for dynamic workers
 
-        @param subtasks_queue: :class:`multiprocessing.Queue` object
-            subtasks are defined in :class:`TaskPartition` objects; each subtask is an item read
-            from this queue.
+        @param subtasks_conn: :class:`multiprocessing.connection.Connection` object
+            The receiving end of a pipe. Subtasks are defined in :class:`TaskPartition` objects;
+            each pickled item received is a list of these or None when the worker should finish.
 
-        @param returns_queue: :class:`multiprocessing.Queue` object
-            Multiplex data from the subtask back to the caller (i.e. the instance that made the
-            sub-tasks).
-            Format for the queue is the output from :meth:`to_json` from any subclass of
+        @param returns_conn: :class:`multiprocessing.connection.Connection` object
+            The sending end of a pipe. Multiplex data from the subtask back to the caller (i.e.
+            the instance that made the sub-tasks).
+            Items sent are the output from :func:`pack_message`, i.e. a pickled subclass of
             :class:`AbstractTaskMessage`.
 
         @param context_kwargs: (dict)
@@ -201,44 +344,60 @@ class LocalProcessPool(AbstractProcessPool):
         # For more detail see unittest TestRuntimeMultiprocess.test_resolver_context_not_inherited
         connector_resolver.brutal_reset()
 
-        with connector_resolver.context(**context_kwargs):
-            # send logs from the sub-task running in separate Process back to the parent down the queue
-            q_logger = QueueLogger(log_prefix=f"Task ({worker_id})", log_queue=returns_queue)
+        # the worker process is dedicated to this pool so the context is never removed
+        connector_resolver.add(**context_kwargs)
 
-            while True:
-                task_message = subtasks_queue.get()
+        # send logs from the sub-task running in separate Process back to the parent down the pipe
+        q_logger = ConnectionLogger(log_prefix=f"Task ({worker_id})", log_conn=returns_conn)
 
-                # None on queue means end process as all work has been completed
-                if task_message is None:
-                    break
+        # The model instance is kept for as long as subtasks need the same class, construction
+        # arguments and worker specific setup. Typically that is all the subtasks from a model.
+        model = None
+        model_key = None
 
+        while True:
+            subtasks_batch = pickle.loads(subtasks_conn.recv_bytes())
+
+            # None means end process as all work has been completed
+            if subtasks_batch is None:
+                break
+
+            for task_message in subtasks_batch:
                 assert isinstance(task_message, TaskPartition)
 
                 if task_message.method_kwargs is None:
                     task_message.method_kwargs = {}
 
-                model = task_message.model_cls(**task_message.model_construction_kwargs)
-                model.set_logger(q_logger)
+                task_model_key = (
+                    task_message.model_cls,
+                    task_message.model_construction_kwargs,
+                    task_message.partition_initialise_kwargs,
+                )
+                if model is None or task_model_key != model_key:
+                    model = task_message.model_cls(**task_message.model_construction_kwargs)
+                    model.set_logger(q_logger)
 
-                # switch off STDOUT as I'm pretty sure it shouldn't be used by a process other than
-                # the parent as only the parent is joined to a terminal.
-                model.log_to_stdout = False
+                    # switch off STDOUT as I'm pretty sure it shouldn't be used by a process other
+                    # than the parent as only the parent is joined to a terminal.
+                    model.log_to_stdout = False
 
-                model.runtime.worker_id = worker_id
-                model.runtime.total_workers = total_workers
+                    model.runtime.worker_id = worker_id
+                    model.runtime.total_workers = total_workers
 
-                model.partition_initialise(**task_message.partition_initialise_kwargs)
+                    model.partition_initialise(**task_message.partition_initialise_kwargs)
+                    model_key = task_model_key
 
-                # TODO - :meth:`log` for the worker processes should be connected back to the parent
-                # with a queue or pipe and it shouldn't be using stdout
+                # TODO - :meth:`log` for the worker processes should be connected back to the
+                # parent with a queue or pipe and it shouldn't be using stdout
 
                 sub_task_method = getattr(model, task_message.method_name)
 
                 try:
                     subtask_return_value = sub_task_method(**task_message.method_kwargs)
+                    # the parent still has `method_kwargs` so save pickling them again
                     task_msg = TaskComplete(
                         method_name=task_message.method_name,
-                        method_kwargs=task_message.method_kwargs,
+                        method_kwargs=None,
                         return_value=subtask_return_value,
                     )
 
@@ -262,6 +421,6 @@ class LocalProcessPool(AbstractProcessPool):
                         traceback=traceback_ln,
                     )
 
-                returns_queue.put(task_msg)
+                returns_conn.send_bytes(pack_message(task_msg))
 
                 model.close_datasets()
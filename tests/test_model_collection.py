@@ -34,6 +34,11 @@ class Six(ayeaye.Model):
     f = Five.f.clone(access=ayeaye.AccessMode.WRITE)
 
 
+class Ten(ayeaye.Model):
+    f = Five.f.clone(access=ayeaye.AccessMode.READ)
+    j = ayeaye.Connect(engine_url="csv://j", access=ayeaye.AccessMode.WRITE)
+
+
 failed_callable_msg = "No test should be calling this as the parent model class isn't instantiated"
 
 
@@ -151,6 +156,17 @@ class TestModelCollection(unittest.TestCase):
         )
         self.assertEqual([{"One"}, {"Two", "Six"}, {"Five"}], self.repr_run_order(r.run_order), msg)
 
+    def test_resolve_run_order_readwrite_is_a_target(self):
+        c = ModelCollection(models={One, Five, Ten})
+        r = c._resolve_run_order()
+
+        leaf_sources = set([c.connector.relayed_kwargs["engine_url"] for c in r.leaf_sources])
+        msg = "Five writes to (f) so it isn't a leaf, even though the access is READWRITE"
+        self.assertEqual({"csv://a"}, leaf_sources, msg)
+
+        msg = "Ten reads (f) so must wait for Five. Five doesn't wait for itself."
+        self.assertEqual([{"One"}, {"Five"}, {"Ten"}], self.repr_run_order(r.run_order), msg)
+
     def test_resolve_with_callable(self):
         "Seven has a callable to build it's engine_url at build time"
         c = ModelCollection(models={One, Eight, Seven})
@@ -230,7 +246,22 @@ class TestModelCollection(unittest.TestCase):
         msg = "There are 3 models"
         self.assertEqual(3, len(models), msg)
 
-    @unittest.skip("TODO: Incomplete provenance code")
+    def test_run_order_single_model(self):
+        self.assertEqual([{Five}], ModelCollection(models={Five}).run_order())
+        self.assertEqual([], ModelCollection(models=set()).run_order())
+
+    def test_graphs_rebuilt_when_models_change(self):
+        c = ModelCollection(models={One, Two})
+        self.assertEqual([{One}, {Two}], c.run_order())
+
+        msg = "Cached graph shouldn't be altered by the caller"
+        c.run_order()[0].add(Three)
+        self.assertEqual([{One}, {Two}], c.run_order(), msg)
+
+        c.models.add(Three)
+        self.assertEqual([{One}, {Two}, {Three}], c.run_order())
+        self.assertEqual(4, len(c.dataset_provenance()[0]))
+
     def test_data_provenance_multiple_graphs(self):
         """
         The set of models contains two separate (none-connected) graphs.
@@ -19,6 +19,23 @@ class TestPinnate(unittest.TestCase):
         self.assertTrue(p[0] == 1 and p[1] == 2 and isinstance(p[2], Pinnate))
         self.assertEqual(p[2].three, 3)
 
+    def test_recurse_same_object(self):
+        "nested items are wrapped once so changes to them are kept"
+        a = Pinnate({"my_things": [{"three": 3}], "my_dict": {"four": 4}})
+        self.assertIs(a.my_things[0], a.my_things[0])
+
+        a.my_things[0].three = "three"
+        a.my_dict.four = "four"
+        a.five = {"six": [{"seven": 7}]}
+        self.assertEqual(7, a.five.six[0].seven)
+
+        expected = {
+            "my_things": [{"three": "three"}],
+            "my_dict": {"four": "four"},
+            "five": {"six": [{"seven": 7}]},
+        }
+        self.assertEqual(expected, a.as_dict())
+
     def test_variable_method_name(self):
         """
         check it's possible to give a variable the same name as an existing method.
@@ -43,6 +60,11 @@ class TestPinnate(unittest.TestCase):
         )
         self.assertEqual(expected, as_json)
 
+    def test_load_json(self):
+        p = Pinnate('{"a": [{"b": 1.5}], "c": NaN, "d": 123456789012345678901234567890}')
+        self.assertEqual(1.5, p.a[0].b)
+        self.assertEqual(123456789012345678901234567890, p.d)
+
     def test_recursive_lists(self):
         "bug found with list inside a list"
 
@@ -66,6 +88,16 @@ class TestPinnate(unittest.TestCase):
         p = Pinnate(d)
         self.assertEqual("hello", p.a[0][0][0].b)
 
+        # deeper than the recursion limit
+        deep = {"c": "bye"}
+        for _ in range(5000):
+            deep = [1, deep]
+        p = Pinnate({"a": deep})
+        innermost = p.a
+        while isinstance(innermost, list):
+            innermost = innermost[1]
+        self.assertEqual("bye", innermost.c)
+
     def test_top_level_list(self):
         "test you can make a Pinnate from a top level list"
 
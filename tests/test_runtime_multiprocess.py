@@ -1,7 +1,7 @@
 import unittest
 
 import ayeaye
-from ayeaye.runtime.multiprocess import LocalProcessPool
+from ayeaye.runtime.multiprocess import LocalProcessPool, SHARED_MEMORY_THRESHOLD
 from ayeaye.runtime.task_message import (
     task_message_factory,
     TaskComplete,
@@ -31,6 +31,22 @@ class ExamineResolverContext(ayeaye.PartitionedModel):
         return r
 
 
+class LargeReturnValue(ayeaye.PartitionedModel):
+    def fake_subtask(self, size):
+        return "x" * size
+
+
+class CountInitialise(ayeaye.PartitionedModel):
+    def partition_initialise(self, **kwargs):
+        super().partition_initialise(**kwargs)
+        self.initialise_count = getattr(self, "initialise_count", 0) + 1
+        self.subtasks_count = 0
+
+    def fake_subtask(self):
+        self.subtasks_count += 1
+        return (id(self), self.initialise_count, self.subtasks_count)
+
+
 class TestRuntimeMultiprocess(unittest.TestCase):
     """
     Test the local execution of :class:`ayeaye.Model`s with multiple processes.
@@ -80,6 +96,47 @@ class TestRuntimeMultiprocess(unittest.TestCase):
                     )
                     self.assertTrue(subtask_msg.return_value["local_variable_set"], msg)
 
+    def test_large_return_value(self):
+        "Return values that are over the shared memory threshold are passed in shared memory"
+        workers_count = 2
+        sizes = [10, SHARED_MEMORY_THRESHOLD * 2]
+        proc_pool = LocalProcessPool(max_processes=workers_count)
+        sub_tasks = [
+            TaskPartition(
+                model_cls=LargeReturnValue,
+                method_name="fake_subtask",
+                method_kwargs={"size": size},
+            )
+            for size in sizes
+        ]
+
+        return_sizes = []
+        for subtask_msg in proc_pool.run_subtasks(sub_tasks=sub_tasks, processes=workers_count):
+            if isinstance(subtask_msg, TaskComplete):
+                self.assertEqual(subtask_msg.method_kwargs["size"], len(subtask_msg.return_value))
+                return_sizes.append(len(subtask_msg.return_value))
+
+        self.assertEqual(sorted(sizes), sorted(return_sizes))
+
+    def test_model_reused_across_subtasks(self):
+        "A worker keeps the model instance while subtasks need the same model"
+        workers_count = 1
+        subtasks_count = 5
+        proc_pool = LocalProcessPool(max_processes=workers_count)
+        sub_tasks = [
+            TaskPartition(model_cls=CountInitialise, method_name="fake_subtask", method_kwargs={})
+            for _ in range(subtasks_count)
+        ]
+
+        return_values = []
+        for subtask_msg in proc_pool.run_subtasks(sub_tasks=sub_tasks, processes=workers_count):
+            if isinstance(subtask_msg, TaskComplete):
+                return_values.append(subtask_msg.return_value)
+
+        self.assertEqual(1, len({model_id for model_id, _, _ in return_values}))
+        self.assertEqual({1}, {initialise_count for _, initialise_count, _ in return_values})
+        self.assertEqual(list(range(1, subtasks_count + 1)), [c for _, _, c in return_values])
+
     def test_task_message_serialisation(self):
         """
         To and from a string which can be transported across a channel which multiplexes different